@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+自适应状态轮询
+
+命令循环完成后，由AdaptivePoller决定状态查询命令（get_img_handle_status、detector_temp等）的发送时机：
+1. 响应中的状态字段保持不变且没有异常时，轮询间隔按backoff_factor指数增加，直到该命令的最大间隔
+2. 状态字段发生变化时，轮询间隔恢复为该命令的最小间隔
+3. 出现计数异常或错误时，立即切换到突发模式，所有命令按burst_interval轮询，
+   持续burst_duration秒没有新的异常后恢复
+"""
+
+import time
+
+
+class PollState:
+    def __init__(self, command, min_interval, max_interval):
+        self.command = command
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.interval = min_interval
+        self.next_due = 0.0
+        self.last_signature = None
+
+
+class AdaptivePoller:
+    def __init__(self, intervals, backoff_factor=2.0, burst_interval=5.0, burst_duration=30.0):
+        """intervals: {命令: (最小间隔, 最大间隔)}，单位为秒"""
+        self.states = [PollState(cmd, lo, hi) for cmd, (lo, hi) in intervals.items()]
+        self.backoff_factor = backoff_factor
+        self.burst_interval = burst_interval
+        self.burst_duration = burst_duration
+        self.burst_until = 0.0
+
+    @classmethod
+    def from_config(cls, section):
+        """从config.ini的[AdaptivePolling]小节创建，除通用选项外每个键都是一条命令: 最小间隔, 最大间隔"""
+        options = ("enabled", "backoff_factor", "burst_interval", "burst_duration")
+        intervals = {}
+        for key, value in section.items():
+            if key in options:
+                continue
+            lo, hi = (float(v) for v in value.split(','))
+            intervals[key] = (lo, hi)
+        return cls(intervals,
+                   backoff_factor=section.getfloat('backoff_factor', 2.0),
+                   burst_interval=section.getfloat('burst_interval', 5.0),
+                   burst_duration=section.getfloat('burst_duration', 30.0))
+
+    def in_burst(self, now=None):
+        now = time.time() if now is None else now
+        return now < self.burst_until
+
+    def reset(self):
+        """重连后所有命令从最小间隔开始，并立即轮询一次"""
+        self.burst_until = 0.0
+        for state in self.states:
+            state.interval = state.min_interval
+            state.next_due = 0.0
+            state.last_signature = None
+
+    def next_command(self, now=None):
+        """返回 (到期的命令, 0)；没有到期的命令时返回 (None, 距离下一条命令到期的秒数)"""
+        if not self.states:
+            return None, 1.0
+        now = time.time() if now is None else now
+        state = min(self.states, key=lambda s: s.next_due)
+        if state.next_due <= now:
+            return state.command, 0.0
+        return None, state.next_due - now
+
+    def report(self, command, signature, anomaly=False, now=None):
+        """记录一次轮询结果，signature为响应中的状态字段，anomaly表示响应中出现了异常"""
+        now = time.time() if now is None else now
+        state = next(s for s in self.states if s.command == command)
+        if anomaly:
+            self.trigger_burst(now)
+        elif signature == state.last_signature:
+            state.interval = min(state.interval * self.backoff_factor, state.max_interval)
+        else:
+            state.interval = state.min_interval
+        state.last_signature = signature
+        state.next_due = now + (self.burst_interval if self.in_burst(now) else state.interval)
+
+    def trigger_burst(self, now=None):
+        """进入（或延长）突发模式，返回是否是新进入突发模式"""
+        now = time.time() if now is None else now
+        started = not self.in_burst(now)
+        self.burst_until = now + self.burst_duration
+        # 刚进入突发模式时所有命令立即轮询，已经在突发模式中时不超过突发间隔
+        due = now if started else now + self.burst_interval
+        for state in self.states:
+            state.interval = state.min_interval
+            state.next_due = min(state.next_due, due)
+        return started
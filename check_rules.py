@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+"""
+检查规则
+
+从check_rules.ini中读取声明式的检查规则，并编译成一个组合匹配器：
+1. 关键字预筛选：所有规则的关键字合并为一个正则，不含任何关键字的行直接跳过
+2. 候选规则：预筛选正则一次扫描找出行中出现的关键字，只对这些关键字所属的规则执行各自的正则，
+   同一行中不同规则的匹配可以重叠；每行的开销随该行候选规则的数量增加
+
+规则文件中每个小节定义一条规则，可用的选项：
+    pattern       正则表达式，用命名分组(?P<name>...)提取字段
+    keywords      逗号分隔的关键字，用于预筛选；没有关键字的规则会使预筛选失效
+    condition     触发条件，如 "recv == 0" 或 "loss_view != 0 or err_view != 0"；为空时总是触发
+    severity      info / warning / error
+    phase         any / before_start / after_start，相对于detector_start的阶段
+    sets_phase    匹配后切换到的阶段，用于标记detector_start
+    message       触发时输出的信息
+    pause_sending yes时，TCPClient在触发后暂停发送命令
+    volatile      yes时字段为持续变化的计数（如recv），自适应轮询判断状态是否稳定时不考虑这些字段
+    keep_in_summary yes时，summary日志模式下匹配该规则的响应行仍写入日志；warning/error规则的匹配行总是写入
+"""
+
+import re
+import configparser
+from collections import namedtuple
+
+PHASE_BEFORE_START = "before_start"
+PHASE_AFTER_START = "after_start"
+PHASES = ("any", PHASE_BEFORE_START, PHASE_AFTER_START)
+SEVERITIES = ("info", "warning", "error")
+
+CONDITION_OPERATORS = {
+    "==": lambda a, b: a == b,
+    "!=": lambda a, b: a != b,
+    ">": lambda a, b: a > b,
+    "<": lambda a, b: a < b,
+    ">=": lambda a, b: a >= b,
+    "<=": lambda a, b: a <= b,
+}
+CONDITION_CLAUSE_PATTERN = re.compile(r'^\s*(\w+)\s*(==|!=|>=|<=|>|<)\s*(\S+)\s*$')
+FIELD_NAME_PATTERN = re.compile(r'\(\?P<(\w+)>')
+
+RuleHit = namedtuple("RuleHit", ["rule", "fields", "phase"])
+
+
+def _convert_value(value):
+    if value is not None and value.isdigit():
+        return int(value)
+    return value
+
+
+class Rule:
+    def __init__(self, name, pattern, keywords=(), condition="", severity="info", phase="any",
+                 sets_phase=None, message="", pause_sending=False, volatile=False, keep_in_summary=False):
+        if severity not in SEVERITIES:
+            raise ValueError(f"规则 {name}: 未知的severity {severity}")
+        if phase not in PHASES:
+            raise ValueError(f"规则 {name}: 未知的phase {phase}")
+        if sets_phase is not None and sets_phase not in PHASES[1:]:
+            raise ValueError(f"规则 {name}: 未知的sets_phase {sets_phase}")
+        self.name = name
+        self.pattern = pattern
+        self.keywords = list(keywords)
+        self.fields = FIELD_NAME_PATTERN.findall(pattern)
+        self.severity = severity
+        self.phase = phase
+        self.sets_phase = sets_phase
+        self.message = message
+        self.pause_sending = pause_sending
+        self.volatile = volatile
+        self.keep_in_summary = keep_in_summary or severity != "info"
+        # 检查正则是否有效
+        re.compile(pattern)
+        self.condition = self._parse_condition(condition)
+        # 条件中用到的字段，如recv error的value、loss_view/err_view，不包括total_view等只是顺带提取的字段
+        self.condition_fields = list(dict.fromkeys(f for and_clauses in self.condition for f, _, _ in and_clauses))
+
+    def _parse_condition(self, condition):
+        """将条件解析为 [[(字段, 运算符, 值), ...], ...]，外层为or，内层为and"""
+        clauses = []
+        if not condition.strip():
+            return clauses
+        for or_part in re.split(r'\s+or\s+', condition.strip()):
+            and_clauses = []
+            for part in re.split(r'\s+and\s+', or_part):
+                match = CONDITION_CLAUSE_PATTERN.match(part)
+                if not match:
+                    raise ValueError(f"规则 {self.name}: 无法解析条件 {part}")
+                field, op, value = match.groups()
+                if field not in self.fields:
+                    raise ValueError(f"规则 {self.name}: 条件中的字段 {field} 不在pattern中")
+                and_clauses.append((field, CONDITION_OPERATORS[op], _convert_value(value)))
+            clauses.append(and_clauses)
+        return clauses
+
+    def evaluate(self, fields):
+        if not self.condition:
+            return True
+        return any(all(op(fields[f], v) for f, op, v in and_clauses) for and_clauses in self.condition)
+
+
+class RuleSet:
+    """编译后的规则集合；scan()按顺序处理每一行，并维护相对于detector_start的阶段"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.phase = PHASE_BEFORE_START
+        self._prefilter = None
+        # [(编译后的正则, [规则, ...]), ...]
+        self._branches = []
+        # 关键字 -> 候选分支的下标列表
+        self._keyword_branches = {}
+        self._compile()
+
+    def _compile(self):
+        if not self.rules:
+            return
+        keywords = []
+        for rule in self.rules:
+            if not rule.keywords:
+                keywords = None
+                break
+            keywords.extend(rule.keywords)
+
+        # pattern相同的规则共用一个正则，每行只需对该正则匹配一次
+        branch_rules = {}
+        for rule in self.rules:
+            branch_rules.setdefault(rule.pattern, []).append(rule)
+        keyword_branches = {}
+        for order, (pattern, rules) in enumerate(branch_rules.items()):
+            self._branches.append((re.compile(pattern), rules))
+            for rule in rules:
+                for keyword in rule.keywords:
+                    keyword_branches.setdefault(keyword, set()).add(order)
+
+        if keywords:
+            # 预筛选使用前瞻，在每个位置都能匹配，关键字之间部分重叠时也不会漏掉；
+            # 同一位置只返回最长的关键字，因此被它包含的关键字所属的分支也作为候选
+            alternation = "|".join(re.escape(k) for k in sorted(keyword_branches, key=len, reverse=True))
+            self._prefilter = re.compile(f"(?=({alternation}))")
+            for keyword in keyword_branches:
+                self._keyword_branches[keyword] = sorted(set().union(
+                    *(branches for other, branches in keyword_branches.items() if other in keyword)))
+
+    def reset(self):
+        self.phase = PHASE_BEFORE_START
+
+    def scan(self, line, misses=None):
+        """扫描一行，返回满足条件的RuleHit列表；传入misses列表时，同时收集pattern匹配但条件不满足的RuleHit"""
+        if not self._branches:
+            return []
+        if self._prefilter is None:
+            candidates = range(len(self._branches))
+        else:
+            # 预筛选一次扫描得到行中出现的关键字，进而得到候选分支
+            candidates = set()
+            for match in self._prefilter.finditer(line):
+                candidates.update(self._keyword_branches[match.group(1)])
+            if not candidates:
+                return []
+        # 每个候选正则单独匹配，不同规则在同一行中的匹配可以重叠，按出现位置排序后依次处理
+        matches = []
+        for order in candidates:
+            regex, rules = self._branches[order]
+            for match in regex.finditer(line):
+                matches.append((match.start(), order, match, rules))
+        matches.sort(key=lambda m: (m[0], m[1]))
+
+        hits = []
+        for _, _, match, rules in matches:
+            phase = self.phase
+            for rule in rules:
+                if rule.phase != "any" and rule.phase != phase:
+                    continue
+                fields = {field: _convert_value(match.group(field)) for field in rule.fields}
+                if not rule.evaluate(fields):
+                    if misses is not None:
+                        misses.append(RuleHit(rule, fields, phase))
+                    continue
+                hits.append(RuleHit(rule, fields, phase))
+                if rule.sets_phase:
+                    self.phase = rule.sets_phase
+        return hits
+
+
+def load_rules(path='check_rules.ini'):
+    config = configparser.ConfigParser(interpolation=None)
+    with open(path, 'r', encoding='utf-8') as f:
+        config.read_file(f)
+    rules = []
+    for name in config.sections():
+        section = config[name]
+        keywords = [k.strip() for k in section.get('keywords', '').split(',') if k.strip()]
+        rules.append(Rule(
+            name,
+            section['pattern'],
+            keywords=keywords,
+            condition=section.get('condition', ''),
+            severity=section.get('severity', 'info'),
+            phase=section.get('phase', 'any'),
+            sets_phase=section.get('sets_phase') or None,
+            message=section.get('message', ''),
+            pause_sending=section.getboolean('pause_sending', False),
+            volatile=section.getboolean('volatile', False),
+            keep_in_summary=section.getboolean('keep_in_summary', False),
+        ))
+    return RuleSet(rules)
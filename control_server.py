@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+"""
+本地控制接口
+
+在本机（默认127.0.0.1:8765）提供HTTP控制接口，用于在不修改sscom51.ini、不重连的情况下控制TCPClient：
+    GET  /status        查看连接、暂停、错误标志和命令循环进度
+    POST /pause         暂停命令循环（保持TCP连接，注入的命令仍然会发送）
+    POST /resume        恢复命令循环
+    POST /clear_error   清除error_detected和recv_zero_detected标志，恢复发送
+    POST /command       注入一条命令并返回其响应，请求体为JSON:
+                        {"command": "detector_state", "priority": 0, "timeout": 30}
+                        priority数值越小越先发送，timeout包括排队和等待响应的时间（秒）
+
+示例：
+    curl http://127.0.0.1:8765/status
+    curl -X POST -d '{"command": "detector_temp"}' http://127.0.0.1:8765/command
+"""
+
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class ControlRequestHandler(BaseHTTPRequestHandler):
+    @property
+    def client(self):
+        return self.server.client
+
+    def do_GET(self):
+        if self.path == "/status":
+            self._send_json(200, self._status())
+        else:
+            self._send_json(404, {"error": f"未知的路径: {self.path}"})
+
+    def do_POST(self):
+        if self.path == "/pause":
+            self.client.paused = True
+            self._log_action("控制接口: 暂停命令循环")
+            self._send_json(200, self._status())
+        elif self.path == "/resume":
+            self.client.paused = False
+            self._log_action("控制接口: 恢复命令循环")
+            self._send_json(200, self._status())
+        elif self.path == "/clear_error":
+            self.client.error_detected = False
+            self.client.recv_zero_detected = False
+            self._log_action("控制接口: 清除错误标志")
+            self._send_json(200, self._status())
+        elif self.path == "/command":
+            self._inject_command()
+        else:
+            self._send_json(404, {"error": f"未知的路径: {self.path}"})
+
+    def _inject_command(self):
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length).decode("utf-8") or "{}")
+            command = str(body["command"]).strip()
+            priority = int(body.get("priority", 0))
+            timeout = float(body.get("timeout", 30))
+        except (ValueError, KeyError, TypeError) as e:
+            self._send_json(400, {"error": f"请求格式错误: {str(e)}"})
+            return
+        if not command:
+            self._send_json(400, {"error": "命令为空"})
+            return
+
+        item = self.client.inject_command(command, priority, timeout)
+        result = {
+            "command": item.command,
+            "priority": item.priority,
+            "response": item.response(),
+            "latency": (item.last_data_time - item.sent_time
+                        if item.sent_time is not None and item.last_data_time is not None else None),
+        }
+        if item.error:
+            result["error"] = item.error
+            self._send_json(504, result)
+        else:
+            self._send_json(200, result)
+
+    def _status(self):
+        client = self.client
+        with client.command_index_lock:
+            index = client.current_command_index
+            current = client.commands[index] if index < len(client.commands) else None
+        return {
+            "connected": client.connected,
+            "paused": client.paused,
+            "error_detected": client.error_detected,
+            "recv_zero_detected": client.recv_zero_detected,
+            "current_command_index": index,
+            "current_command": current,
+            "command_count": len(client.commands),
+            "queued_commands": client.send_queue.qsize(),
+        }
+
+    def _log_action(self, message):
+        print(f"[{self.client.get_timestamp()}] {message}")
+        self.client.write_log(message)
+
+    def _send_json(self, status, data):
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        # 控制接口的访问记录不输出到控制台
+        pass
+
+
+class ControlServer:
+    def __init__(self, client, host="127.0.0.1", port=8765):
+        self.httpd = ThreadingHTTPServer((host, port), ControlRequestHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.client = client
+
+    def start(self):
+        thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        thread.start()
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+飞行记录器
+
+在内存中保存最近N条通信记录（环形缓冲区），平时不写磁盘。
+检测到异常（存在错误、recv计数停止增长、连接断开）时，将整个窗口转储到日志目录，
+转储文件与普通日志格式相同，可以直接用log_analyzer.py分析。
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+
+class FlightRecorder:
+    def __init__(self, log_file, capacity=2000):
+        # 转储文件与日志文件放在同一目录，文件名为 <日志文件名>_dump_<序号>.txt
+        self.dump_prefix = os.path.splitext(log_file)[0] + "_dump_"
+        self.entries = deque(maxlen=capacity)
+        self.lock = threading.Lock()
+        self.dump_count = 0
+        # 已记录的条数，用于避免同一窗口被连续转储多次
+        self.recorded = 0
+        self.recorded_at_last_dump = 0
+
+    def record(self, message):
+        # deque.append在多线程下是安全的，时间在转储时才格式化
+        self.entries.append((time.time(), message))
+        self.recorded += 1
+
+    def dump(self, reason):
+        """将当前窗口写入转储文件，返回文件名；自上次转储后没有新记录时不转储，返回None"""
+        with self.lock:
+            if self.recorded == self.recorded_at_last_dump:
+                return None
+            self.recorded_at_last_dump = self.recorded
+            self.dump_count += 1
+            filename = f"{self.dump_prefix}{self.dump_count:03d}.txt"
+            entries = list(self.entries)
+
+        with open(filename, 'w', encoding='utf-8') as f:
+            f.write(f"[{self._format_time(time.time())}] 飞行记录器转储: {reason}, 共 {len(entries)} 条记录\n")
+            for timestamp, message in entries:
+                f.write(f"[{self._format_time(timestamp)}] {message}\n")
+        return filename
+
+    @staticmethod
+    def _format_time(timestamp):
+        return datetime.fromtimestamp(timestamp).strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
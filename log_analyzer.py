@@ -7,15 +7,41 @@
 2. 检查DAS参数配置是否成功
 3. 检查DCB连接状态
 4. 检查数据接收状态
-5. 检查各类错误信息
+5. 检查各类错误信息（检查规则定义在check_rules.ini中）
+6. 从日志时间戳重建每条命令的往返延迟（--latency）
+7. 比较两组测试的延迟、命令循环时间和错误率，检测性能退化（--compare）
 """
 
 import re
 import sys
 import os
+import glob
+import math
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
 
-def analyze_log(log_file):
+import numpy as np
+
+from check_rules import load_rules, PHASE_BEFORE_START
+
+# 默认检查规则文件
+DEFAULT_RULES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "check_rules.ini")
+
+# 日志行格式: [YYYY-MM-DD HH:MM:SS.mmm] 内容
+LOG_LINE_PATTERN = re.compile(r'^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}\.\d{3})\] (.*)$')
+# 连接断开相关的日志信息，用于计算重连停机时间
+DISCONNECT_MARKERS = ("连接错误", "发送错误", "接收错误", "连接被拒绝")
+# 命令循环完成的日志信息
+CYCLE_COMPLETE_MARKER = "完成一个完整的命令循环"
+# 比较模式的提取结果缓存版本，提取逻辑变化时需要加1，使旧缓存失效
+METRICS_CACHE_VERSION = 2
+
+def analyze_log(log_file, rules_file=None):
+    # 加载检查规则，所有规则编译为一个组合匹配器
+    rules = load_rules(rules_file or DEFAULT_RULES_FILE)
+
     # 初始化变量
     connection_count = 0
     das_config_success = True
@@ -39,6 +65,8 @@ def analyze_log(log_file):
     errors_215_217_times = []
     errors_234 = []
     errors_234_times = []
+    # 其他规则的检查结果: 规则名 -> [(时间, 行内容), ...]
+    other_rule_hits = {}
     dcb_error_time = None
     has_error = False
 
@@ -46,74 +74,71 @@ def analyze_log(log_file):
     with open(log_file, 'r', encoding='utf-8') as f:
         lines = f.readlines()
 
-    # 逐行分析日志
-    for i, line in enumerate(lines):
-        # 1. 检测网络连接成功
-        if "成功连接到服务器" in line:
-            connection_count += 1
-
-        # 2. 检测DAS参数配置步骤
-        for step in das_config_steps.keys():
-            if f"发送: {step}" in line:
-                das_config_steps[step]["sent"] = True
-                # 记录时间戳，用于可能的错误报告
-                if not das_config_steps[step]["received"]:
-                    timestamp_match = re.search(r'\[(.*?)\]', line)
-                    if timestamp_match:
-                        das_config_error_time = timestamp_match.group(1)
-            elif f"接收: {step}" in line:
-                das_config_steps[step]["received"] = True
-
-        # 3. 检测开始采集时间（用于判断DCB连接状态）
-        if "发送: detector_start" in line:
-            timestamp_match = re.search(r'\[(.*?)\]', line)
-            if timestamp_match:
-                detector_start_time = timestamp_match.group(1)
-
-        # 4. 检查sfp_connet状态和collect_flag状态
-        if "detail:" in line and "sfp_connet" in line:
-            # 提取sfp_connet状态
-            sfp_connect_match = re.search(r'detail:.+?sfp_connet\[(\d)\].+?collect_flag\[(\d)\]', line)
-            if sfp_connect_match:
-                sfp_connect_status = sfp_connect_match.group(1)
-                collect_flag_status = sfp_connect_match.group(2)
-                # 判断是在detector_start之前还是之后
-                if detector_start_time is None:
-                    sfp_connect_before_start = sfp_connect_status
-                    collect_flag_before_start = collect_flag_status
+    # 逐行分析日志，每行只经过一次规则匹配
+    for line in lines:
+        hits = rules.scan(line)
+        if not hits:
+            continue
+        timestamp_match = re.search(r'\[(.*?)\]', line)
+        timestamp = timestamp_match.group(1) if timestamp_match else None
+
+        seen_rules = set()
+        for hit in hits:
+            name = hit.rule.name
+            # 同一规则在一行中只处理一次
+            if name in seen_rules:
+                continue
+            seen_rules.add(name)
+            # 1. 检测网络连接成功
+            if name == "connect":
+                connection_count += 1
+
+            # 2. 检测DAS参数配置步骤
+            elif name == "das_step":
+                step = hit.fields["step"]
+                if hit.fields["direction"] == "发送":
+                    das_config_steps[step]["sent"] = True
+                    # 记录时间戳，用于可能的错误报告
+                    if not das_config_steps[step]["received"] and timestamp:
+                        das_config_error_time = timestamp
+                else:
+                    das_config_steps[step]["received"] = True
+
+            # 3. 检测开始采集时间（用于判断DCB连接状态）
+            elif name == "detector_start":
+                if timestamp:
+                    detector_start_time = timestamp
+
+            # 4. 检查sfp_connet状态和collect_flag状态，判断是在detector_start之前还是之后
+            elif name == "sfp_connect":
+                if hit.phase == PHASE_BEFORE_START:
+                    sfp_connect_before_start = str(hit.fields["sfp_connet"])
+                    collect_flag_before_start = str(hit.fields["collect_flag"])
                 else:
-                    sfp_connect_after_start = sfp_connect_status
-                    collect_flag_after_start = collect_flag_status
+                    sfp_connect_after_start = str(hit.fields["sfp_connet"])
+                    collect_flag_after_start = str(hit.fields["collect_flag"])
 
-        # 5. 检查recv是否为0
-        if "recv:" in line and not "recv error" in line:
-            recv_match = re.search(r'recv:(\d+)', line)
-            if recv_match and recv_match.group(1) == '0':
+            # 5. 检查recv是否为0
+            elif name == "recv_zero":
                 recv_zero = True
-                # 记录时间戳
-                timestamp_match = re.search(r'\[(.*?)\]', line)
-                if timestamp_match:
-                    recv_zero_time = timestamp_match.group(1)
-
-        # 6. 检查215-217行的错误
-        if "recv error:" in line or "sample error:" in line or "angle error:" in line:
-            error_match = re.search(r'(recv error|sample error|angle error):(\d+)', line)
-            if error_match and error_match.group(2) != '0':
+                if timestamp:
+                    recv_zero_time = timestamp
+
+            # 6. 检查215-217行的错误
+            elif name == "sample_errors":
                 errors_215_217.append(line.strip())
-                # 记录时间戳
-                timestamp_match = re.search(r'\[(.*?)\]', line)
-                if timestamp_match:
-                    errors_215_217_times.append(timestamp_match.group(1))
-
-        # 7. 检查234行的错误
-        if "loss_view" in line and "err_view" in line and "total_view" in line:
-            error_match = re.search(r'loss_view\[(\d+)\],err_view\[(\d+)\],total_view\[(\d+)\]', line)
-            if error_match and (error_match.group(1) != '0' or error_match.group(2) != '0'):
+                if timestamp:
+                    errors_215_217_times.append(timestamp)
+
+            # 7. 检查234行的错误
+            elif name == "view_errors":
                 errors_234.append(line.strip())
-                # 记录时间戳
-                timestamp_match = re.search(r'\[(.*?)\]', line)
-                if timestamp_match:
-                    errors_234_times.append(timestamp_match.group(1))
+                if timestamp:
+                    errors_234_times.append(timestamp)
+
+            # 8. 规则文件中新增的其他规则
+            elif hit.rule.severity != "info":
+                other_rule_hits.setdefault(name, []).append((timestamp or "未知", line.strip()))
 
     # 检查DAS参数配置是否成功
     for step, status in das_config_steps.items():
@@ -185,26 +210,487 @@ def analyze_log(log_file):
     else:
         print("   未检测到错误")
     
-    # 7. 总结是否存在错误
-    print("\n7. 总体状态:")
+    # 7. 打印其他规则的检查结果
+    print("\n7. 其他规则检查:")
+    if other_rule_hits:
+        for name, rule_hits in other_rule_hits.items():
+            rule = next(r for r in rules.rules if r.name == name)
+            print(f"   {name}: {rule.message or rule.severity} ({len(rule_hits)}次)")
+            for time_str, content in rule_hits:
+                print(f"   {content}")
+                print(f"   发生时间: {time_str}")
+            if rule.severity == "error":
+                has_error = True
+    else:
+        print("   未检测到异常")
+    
+    # 8. 总结是否存在错误
+    print("\n8. 总体状态:")
     if has_error:
         print("   存在错误")
     else:
         print("   未检测到错误")
 
+def extract_events(log_file, rules=None):
+    """提取日志中的时间戳和事件，返回由numpy数组组成的字典
+
+    所有位置数组都是日志中带时间戳的行的序号，可以直接作为times的下标。
+    发送和接收事件的命令名以整数编码保存，编码对应commands列表中的下标。
+    指定rules时，同时记录触发error级别检查规则的行（error_pos），
+    以及检查规则提取到collect_flag字段的行和对应的值（collect_pos/collect_value）。
+    """
+    timestamps = []
+    commands = []
+    command_codes = {}
+    send_pos, send_cmd = [], []
+    recv_pos, recv_cmd = [], []
+    start_pos = []
+    collect_pos, collect_value = [], []
+    connect_pos = []
+    disconnect_pos = []
+    cycle_pos = []
+    error_pos = []
+
+    with open(log_file, 'r', encoding='utf-8') as f:
+        for line in f:
+            match = LOG_LINE_PATTERN.match(line)
+            if not match:
+                continue
+            pos = len(timestamps)
+            timestamps.append(match.group(1))
+            message = match.group(2)
+
+            if message.startswith("发送: ") or message.startswith("接收: "):
+                content = message[4:].strip()
+                name = content.split(' ')[0] if content else ""
+                code = command_codes.setdefault(name, len(commands))
+                if code == len(commands):
+                    commands.append(name)
+                if message[0] == "发":
+                    send_pos.append(pos)
+                    send_cmd.append(code)
+                    if name == "detector_start":
+                        start_pos.append(pos)
+                else:
+                    recv_pos.append(pos)
+                    recv_cmd.append(code)
+            elif "成功连接到服务器" in message:
+                connect_pos.append(pos)
+            elif message.startswith(DISCONNECT_MARKERS):
+                disconnect_pos.append(pos)
+            elif message.startswith(CYCLE_COMPLETE_MARKER):
+                cycle_pos.append(pos)
+
+            if rules is not None:
+                hits = rules.scan(message)
+                if any(hit.rule.severity == "error" for hit in hits):
+                    error_pos.append(pos)
+                for hit in hits:
+                    if "collect_flag" in hit.fields:
+                        collect_pos.append(pos)
+                        collect_value.append(hit.fields["collect_flag"])
+                        break
+
+    return {
+        "times": np.array(timestamps, dtype='datetime64[ms]').astype(np.int64),
+        "commands": commands,
+        "send_pos": np.array(send_pos, dtype=np.int64),
+        "send_cmd": np.array(send_cmd, dtype=np.int64),
+        "recv_pos": np.array(recv_pos, dtype=np.int64),
+        "recv_cmd": np.array(recv_cmd, dtype=np.int64),
+        "start_pos": np.array(start_pos, dtype=np.int64),
+        "collect_pos": np.array(collect_pos, dtype=np.int64),
+        "collect_value": np.array(collect_value, dtype=np.int64),
+        "connect_pos": np.array(connect_pos, dtype=np.int64),
+        "disconnect_pos": np.array(disconnect_pos, dtype=np.int64),
+        "cycle_pos": np.array(cycle_pos, dtype=np.int64),
+        "error_pos": np.array(error_pos, dtype=np.int64),
+    }
+
+
+def pair_command_latencies(events):
+    """将每条发送与其后第一条同名接收配对，返回 (命令编码数组, 延迟毫秒数组)
+
+    接收必须出现在下一条发送之前，否则视为该命令没有响应。发送线程和接收线程
+    各自写日志，快速响应的接收行可能先于对应的发送行写入，时间戳相同，
+    这种情况按延迟0处理。
+    """
+    send_pos, send_cmd = events["send_pos"], events["send_cmd"]
+    recv_pos, recv_cmd = events["recv_pos"], events["recv_cmd"]
+    times = events["times"]
+    if send_pos.size == 0 or recv_pos.size == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # 每条接收之前最近的一条发送
+    prev_send = np.searchsorted(send_pos, recv_pos) - 1
+    valid = prev_send >= 0
+    valid[valid] = send_cmd[prev_send[valid]] == recv_cmd[valid]
+    # 接收行写在对应发送行之前的情况
+    next_send = prev_send + 1
+    early = ~valid & (next_send < send_pos.size)
+    early[early] = ((send_cmd[next_send[early]] == recv_cmd[early]) &
+                    (times[send_pos[next_send[early]]] == times[recv_pos[early]]))
+    prev_send = np.where(early, next_send, prev_send)
+    valid |= early
+    prev_send = prev_send[valid]
+    matched_recv = recv_pos[valid]
+    # 同一条发送只取第一条接收
+    prev_send, first = np.unique(prev_send, return_index=True)
+    matched_recv = matched_recv[first]
+
+    latencies = times[matched_recv] - times[send_pos[prev_send]]
+    return send_cmd[prev_send], latencies
+
+
+def latency_distribution(latencies):
+    """计算延迟分布（毫秒）"""
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        "count": int(latencies.size),
+        "p50": float(p50),
+        "p95": float(p95),
+        "p99": float(p99),
+        "max": float(latencies.max()),
+    }
+
+
+def _first_after(starts, events, limits):
+    """对每个起点，返回其后第一个事件的下标，事件必须在对应的limit之前；返回 (有效的起点掩码, 事件下标)"""
+    if starts.size == 0 or events.size == 0:
+        return np.zeros(starts.size, dtype=bool), np.empty(0, dtype=np.int64)
+    nxt = np.searchsorted(events, starts)
+    valid = nxt < events.size
+    valid[valid] = events[nxt[valid]] < limits[valid]
+    return valid, nxt[valid]
+
+
+def compute_latency_stats(events):
+    """根据提取的事件计算每条命令的延迟分布、采集启动时间和重连停机时间"""
+    times = events["times"]
+    codes, latencies = pair_command_latencies(events)
+    per_command = {}
+    for code in np.unique(codes):
+        per_command[events["commands"][code]] = latency_distribution(latencies[codes == code])
+    unanswered = events["send_pos"].size - latencies.size
+
+    # detector_start 到 collect_flag 由0变为1的时间，collect_flag必须在下一次detector_start之前变为1；
+    # detector_start时collect_flag已经为1的不计入
+    start_pos, collect_pos, collect_value = events["start_pos"], events["collect_pos"], events["collect_value"]
+    rising = (collect_value[1:] == 1) & (collect_value[:-1] == 0)
+    collect_on_pos = collect_pos[1:][rising]
+    # 每次detector_start之前最后一次记录的collect_flag，之前没有记录时为-1
+    state_at_start = np.r_[-1, collect_value][np.searchsorted(collect_pos, start_pos)]
+    next_start = np.append(start_pos[1:], np.iinfo(np.int64).max)
+    keep = state_at_start != 1
+    start_pos, next_start = start_pos[keep], next_start[keep]
+    valid, next_on = _first_after(start_pos, collect_on_pos, next_start)
+    start_to_collect = times[collect_on_pos[next_on]] - times[start_pos[valid]]
+
+    # 重连停机时间：上一次连接成功后的第一条断开信息 到 下一次连接成功
+    connect_pos, disconnect_pos = events["connect_pos"], events["disconnect_pos"]
+    valid, first_drop = _first_after(connect_pos[:-1], disconnect_pos, connect_pos[1:])
+    downtime_start = disconnect_pos[first_drop]
+    downtime = times[connect_pos[1:][valid]] - times[downtime_start]
+
+    return {
+        "per_command": per_command,
+        "unanswered": int(unanswered),
+        "start_to_collect": start_to_collect,
+        "downtime": downtime,
+        "downtime_start": times[downtime_start],
+    }
+
+
+def _format_ms_timestamp(ms):
+    return str(np.datetime64(int(ms), 'ms')).replace('T', ' ')
+
+
+def analyze_latency(log_file, rules_file=None):
+    stats = compute_latency_stats(extract_events(log_file, load_rules(rules_file or DEFAULT_RULES_FILE)))
+
+    print(f"日志文件: {log_file}")
+    print("\n延迟分析结果:")
+
+    print("\n1. 命令往返延迟(ms):")
+    if stats["per_command"]:
+        print(f"   {'命令':<32} {'次数':>6} {'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}")
+        for cmd, dist in sorted(stats["per_command"].items()):
+            print(f"   {cmd:<32} {dist['count']:>6} {dist['p50']:>8.0f} {dist['p95']:>8.0f} "
+                  f"{dist['p99']:>8.0f} {dist['max']:>8.0f}")
+    else:
+        print("   未找到可配对的发送/接收记录")
+    print(f"   未收到响应的发送次数: {stats['unanswered']}")
+
+    print("\n2. detector_start 到 collect_flag由0变为1 的时间:")
+    if stats["start_to_collect"].size:
+        values = stats["start_to_collect"]
+        print(f"   次数: {values.size}, 最短: {values.min()} ms, 中位数: {np.median(values):.0f} ms, 最长: {values.max()} ms")
+    else:
+        print("   未找到detector_start之后collect_flag由0变为1的记录")
+
+    print("\n3. 重连停机时间:")
+    if stats["downtime"].size:
+        for start, duration in zip(stats["downtime_start"], stats["downtime"]):
+            print(f"   {_format_ms_timestamp(start)} 断开, 停机 {duration / 1000:.3f} 秒")
+        print(f"   共 {stats['downtime'].size} 次, 总停机时间: {stats['downtime'].sum() / 1000:.3f} 秒")
+    else:
+        print("   未检测到重连")
+
+def extract_run_metrics(log_file, rules_file=None):
+    """提取一次测试的性能数据：每条命令的延迟、命令循环时间、含错误的响应数和未响应的发送次数"""
+    events = extract_events(log_file, load_rules(rules_file or DEFAULT_RULES_FILE))
+    times = events["times"]
+    codes, latencies = pair_command_latencies(events)
+
+    # 命令循环时间：连接成功 到 该连接中第一次完成命令循环
+    connect_pos, cycle_pos = events["connect_pos"], events["cycle_pos"]
+    next_connect = np.append(connect_pos[1:], np.iinfo(np.int64).max)
+    valid, first_cycle = _first_after(connect_pos, cycle_pos, next_connect)
+    cycle_times = times[cycle_pos[first_cycle]] - times[connect_pos[valid]]
+
+    # 错误行归属到其前面最近的接收记录，一条响应中有多行错误时只计一次，保证错误数不超过接收数
+    recv_pos = events["recv_pos"]
+    owner = np.searchsorted(recv_pos, events["error_pos"], side='right') - 1
+    error_responses = np.unique(owner[owner >= 0]).size
+
+    return {
+        "commands": np.array(events["commands"], dtype=str),
+        "codes": codes,
+        "latencies": latencies,
+        "cycle_times": cycle_times,
+        "sends": np.int64(events["send_pos"].size),
+        "responses": np.int64(events["recv_pos"].size),
+        "unanswered": np.int64(events["send_pos"].size - latencies.size),
+        "errors": np.int64(error_responses),
+    }
+
+
+def _rules_digest(rules_file):
+    with open(rules_file, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def load_run_metrics(log_file, rules_file, cache_dir, rules_digest=None):
+    """读取一次测试的性能数据，结果按文件缓存，日志文件或检查规则变化后重新提取"""
+    rules_digest = rules_digest or _rules_digest(rules_file)
+    stat = os.stat(log_file)
+    key = f"{METRICS_CACHE_VERSION}|{os.path.abspath(log_file)}|{stat.st_size}|{stat.st_mtime_ns}|{rules_digest}"
+    cache_file = os.path.join(cache_dir, hashlib.sha1(key.encode('utf-8')).hexdigest() + ".npz")
+    if os.path.exists(cache_file):
+        with np.load(cache_file) as data:
+            return {name: data[name] for name in data.files}
+
+    metrics = extract_run_metrics(log_file, rules_file)
+    os.makedirs(cache_dir, exist_ok=True)
+    # 先写临时文件再改名，避免并行提取时读到不完整的缓存
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp.npz"
+    np.savez(tmp_file, **metrics)
+    os.replace(tmp_file, cache_file)
+    return metrics
+
+
+def expand_log_paths(paths):
+    """展开文件、目录和通配符，目录中只取日志文件，不包括飞行记录器的转储文件"""
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            candidates = glob.glob(os.path.join(path, "*.txt"))
+        else:
+            candidates = glob.glob(path) or [path]
+        files.extend(sorted(f for f in candidates if "_dump_" not in os.path.basename(f)))
+    return files
+
+
+def load_run_set(paths, rules_file, cache_dir, jobs=None):
+    """读取一组测试，合并每条命令的延迟、命令循环时间以及错误和未响应的计数"""
+    files = expand_log_paths(paths)
+    digest = _rules_digest(rules_file)
+    if jobs == 1 or len(files) <= 1:
+        runs = [load_run_metrics(f, rules_file, cache_dir, digest) for f in files]
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            runs = list(executor.map(load_run_metrics, files, [rules_file] * len(files),
+                                     [cache_dir] * len(files), [digest] * len(files)))
+
+    latencies = {}
+    for run in runs:
+        commands = run["commands"]
+        for code in np.unique(run["codes"]):
+            latencies.setdefault(str(commands[code]), []).append(run["latencies"][run["codes"] == code])
+    empty = np.empty(0, dtype=np.int64)
+    return {
+        "files": files,
+        "latencies": {cmd: np.concatenate(values) for cmd, values in latencies.items()},
+        "cycle_times": np.concatenate([run["cycle_times"] for run in runs] or [empty]),
+        "sends": int(sum(int(run["sends"]) for run in runs)),
+        "responses": int(sum(int(run["responses"]) for run in runs)),
+        "unanswered": int(sum(int(run["unanswered"]) for run in runs)),
+        "errors": int(sum(int(run["errors"]) for run in runs)),
+    }
+
+
+def _average_ranks(values):
+    """返回平均秩（从1开始，相同的值取平均）以及并列组大小"""
+    sorter = np.argsort(values, kind='mergesort')
+    ordered = values[sorter]
+    is_new = np.r_[True, ordered[1:] != ordered[:-1]]
+    group = np.cumsum(is_new) - 1
+    counts = np.bincount(group)
+    ends = np.cumsum(counts)
+    ranks = np.empty(values.size, dtype=np.float64)
+    ranks[sorter] = (ends - (counts - 1) / 2.0)[group]
+    return ranks, counts
+
+
+def mann_whitney_greater(baseline, candidate):
+    """单侧Mann-Whitney U检验（正态近似，含并列校正），检验candidate是否大于baseline
+
+    返回 (p值, Cliff's delta)；delta为正表示candidate整体偏大，取值范围[-1, 1]。
+    """
+    n1, n2 = baseline.size, candidate.size
+    ranks, ties = _average_ranks(np.concatenate([baseline, candidate]).astype(np.float64))
+    u = ranks[n1:].sum() - n2 * (n2 + 1) / 2.0
+    delta = 2.0 * u / (n1 * n2) - 1.0
+    n = n1 + n2
+    variance = n1 * n2 / 12.0 * ((n + 1) - (ties ** 3 - ties).sum() / (n * (n - 1)))
+    if variance <= 0:
+        return 1.0, delta
+    # 连续性校正
+    z = (u - n1 * n2 / 2.0 - 0.5) / math.sqrt(variance)
+    return 0.5 * math.erfc(z / math.sqrt(2)), delta
+
+
+def proportion_greater(base_count, base_total, cand_count, cand_total):
+    """单侧两比例z检验，检验candidate的比例是否大于baseline，返回 (p值, Cohen's h)"""
+    # 比例限制在[0, 1]内，避免计数超过总数时asin出现math domain error
+    p1 = min(max(base_count / base_total, 0.0), 1.0)
+    p2 = min(max(cand_count / cand_total, 0.0), 1.0)
+    h = 2 * math.asin(math.sqrt(p2)) - 2 * math.asin(math.sqrt(p1))
+    pooled = min(max((base_count + cand_count) / (base_total + cand_total), 0.0), 1.0)
+    se = math.sqrt(pooled * (1 - pooled) * (1 / base_total + 1 / cand_total))
+    if se == 0:
+        return 1.0, h
+    z = (p2 - p1) / se
+    return 0.5 * math.erfc(z / math.sqrt(2)), h
+
+
+def compare_run_sets(baseline, candidate, alpha=0.01, min_effect=0.2, min_samples=5):
+    """比较两组测试，返回每项指标的比较结果列表
+
+    分布类指标（命令延迟、命令循环时间）使用Mann-Whitney U检验和Cliff's delta，
+    比例类指标（错误率、未响应率）使用两比例z检验和Cohen's h。显著性水平按指标数量做Bonferroni校正，
+    只有显著且效应量不小于min_effect的变差才判定为退化。
+    """
+    results = []
+    distributions = [(f"延迟 {cmd}", baseline["latencies"][cmd], candidate["latencies"][cmd], "ms")
+                     for cmd in sorted(set(baseline["latencies"]) & set(candidate["latencies"]))]
+    distributions.append(("命令循环时间", baseline["cycle_times"], candidate["cycle_times"], "ms"))
+    for name, base, cand, unit in distributions:
+        if base.size < min_samples or cand.size < min_samples:
+            continue
+        p_value, effect = mann_whitney_greater(base, cand)
+        results.append({
+            "metric": name,
+            "baseline": f"p50={np.median(base):.0f}{unit} p95={np.percentile(base, 95):.0f}{unit} n={base.size}",
+            "candidate": f"p50={np.median(cand):.0f}{unit} p95={np.percentile(cand, 95):.0f}{unit} n={cand.size}",
+            "effect_name": "Cliff's delta",
+            "effect": effect,
+            "p_value": p_value,
+        })
+
+    proportions = [("错误率(含错误的响应/接收)", "errors", "responses"), ("未响应率(未响应/发送)", "unanswered", "sends")]
+    for name, count_key, total_key in proportions:
+        if baseline[total_key] < min_samples or candidate[total_key] < min_samples:
+            continue
+        p_value, effect = proportion_greater(baseline[count_key], baseline[total_key],
+                                             candidate[count_key], candidate[total_key])
+        results.append({
+            "metric": name,
+            "baseline": f"{baseline[count_key] / baseline[total_key]:.2%} ({baseline[count_key]}/{baseline[total_key]})",
+            "candidate": f"{candidate[count_key] / candidate[total_key]:.2%} ({candidate[count_key]}/{candidate[total_key]})",
+            "effect_name": "Cohen's h",
+            "effect": effect,
+            "p_value": p_value,
+        })
+
+    corrected_alpha = alpha / max(len(results), 1)
+    for result in results:
+        result["regression"] = result["p_value"] < corrected_alpha and result["effect"] >= min_effect
+    return results
+
+
+def compare_runs(baseline_paths, candidate_paths, rules_file=None, alpha=0.01, min_effect=0.2,
+                 cache_dir=None, jobs=None):
+    """比较两组测试并输出结果，存在性能退化时返回True；没有日志文件或没有可比较的指标时抛出ValueError"""
+    rules_file = rules_file or DEFAULT_RULES_FILE
+    cache_dir = cache_dir or os.path.join(os.path.dirname(os.path.abspath(__file__)), "logs", ".metrics_cache")
+    baseline = load_run_set(baseline_paths, rules_file, cache_dir, jobs)
+    candidate = load_run_set(candidate_paths, rules_file, cache_dir, jobs)
+
+    print(f"基准组: {len(baseline['files'])} 个日志文件")
+    print(f"对比组: {len(candidate['files'])} 个日志文件")
+    if not baseline["files"] or not candidate["files"]:
+        raise ValueError("日志文件为空，无法比较")
+
+    results = compare_run_sets(baseline, candidate, alpha, min_effect)
+    if not results:
+        raise ValueError("所有指标的样本数都不足，无法比较")
+    print(f"\n比较结果 (显著性水平 {alpha}，按 {len(results)} 项指标校正; 最小效应量 {min_effect}):")
+    for result in results:
+        status = "退化" if result["regression"] else "正常"
+        print(f"\n   [{status}] {result['metric']}")
+        print(f"   基准组: {result['baseline']}")
+        print(f"   对比组: {result['candidate']}")
+        print(f"   {result['effect_name']}={result['effect']:+.3f}, p={result['p_value']:.2g}")
+
+    regressions = [r["metric"] for r in results if r["regression"]]
+    print("\n总体状态:")
+    if regressions:
+        print(f"   检测到性能退化: {', '.join(regressions)}")
+    else:
+        print("   未检测到性能退化")
+    return bool(regressions)
+
 def main():
     # 设置默认日志文件路径
     current_dir = os.path.dirname(os.path.abspath(__file__))
     default_log_file = os.path.join(current_dir, "logs", "2025-04-30_15-48-52.txt")
     
-    if len(sys.argv) > 1:
-        log_file = sys.argv[1]
+    parser = argparse.ArgumentParser(description="RCS自动测试日志分析工具")
+    parser.add_argument("log_file", nargs="?", help="要分析的日志文件")
+    parser.add_argument("--latency", action="store_true", help="重建每条命令的往返延迟分布")
+    parser.add_argument("--rules", help="检查规则文件，默认为check_rules.ini")
+    parser.add_argument("--compare", action="store_true",
+                        help="比较两组测试，存在性能退化时以返回码1退出")
+    parser.add_argument("--baseline", nargs="+", help="基准组的日志文件、目录或通配符")
+    parser.add_argument("--candidate", nargs="+", help="对比组的日志文件、目录或通配符")
+    parser.add_argument("--alpha", type=float, default=0.01, help="显著性水平")
+    parser.add_argument("--min-effect", type=float, default=0.2, help="判定为退化的最小效应量")
+    parser.add_argument("--jobs", type=int, help="并行提取的进程数，默认为CPU核数")
+    args = parser.parse_args()
+
+    if args.compare:
+        if not args.baseline or not args.candidate:
+            parser.error("--compare 需要同时指定 --baseline 和 --candidate")
+        try:
+            regression = compare_runs(args.baseline, args.candidate, args.rules, args.alpha,
+                                      args.min_effect, jobs=args.jobs)
+        except Exception as e:
+            print(f"比较过程中出错: {e}")
+            sys.exit(2)
+        sys.exit(1 if regression else 0)
+
+    if args.log_file:
+        log_file = args.log_file
     else:
         log_file = default_log_file
         print(f"使用默认日志文件: {log_file}")
     
     try:
-        analyze_log(log_file)
+        if args.latency:
+            analyze_latency(log_file, args.rules)
+        else:
+            analyze_log(log_file, args.rules)
     except Exception as e:
         print(f"分析过程中出错: {e}")
 
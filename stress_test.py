@@ -0,0 +1,477 @@
+# -*- coding: utf-8 -*-
+"""
+压力测试工具
+
+此脚本用于测试RCS探测器固件的命令吞吐上限，主要功能包括：
+1. 从sscom51.ini中选择要发送的命令组合
+2. 按目标速率（rate模式）或背靠背闭环（closed模式）发送命令
+3. 支持多个并行TCP连接
+4. 逐级提升负载，统计每一级的实际吞吐量、延迟分位数以及错误/loss_view出现情况
+
+每个连接由发送线程和接收线程组成。rate模式下发送线程按计划时间发送，不等待响应；
+closed模式下收到上一条命令的响应后立即发送下一条。接收线程按响应首行回显的命令名
+与尚未响应的命令配对，延迟为发送到收到回显的时间。
+
+用法示例：
+    python stress_test.py --mode rate --levels 1,2,5,10,20 --connections 2
+    python stress_test.py --mode closed --levels 1,2,4,8 --duration 60
+"""
+
+import argparse
+import configparser
+import re
+import socket
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+from tcp_client import load_sscom_commands
+
+# 默认的命令组合：只包含状态查询命令，避免压测时重复配置或重启探测器
+DEFAULT_COMMANDS = ["get_img_handle_status", "get_pcie_status", "detector_info", "detector_state", "detector_temp"]
+
+LOSS_VIEW_PATTERN = re.compile(r'loss_view\[(\d+)\],err_view\[(\d+)\],total_view\[(\d+)\]')
+ERROR_PATTERN = re.compile(r'(recv error|sample error|angle error):\s*(\d+)')
+
+# 实际发送速率低于目标速率的该比例时，在结果中提示未达到目标速率
+RATE_SHORTFALL_RATIO = 0.95
+
+
+def get_timestamp():
+    return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
+
+
+def percentile(values, p):
+    """计算已排序列表的百分位数（线性插值），列表为空时返回None"""
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+class StressConnection:
+    """单个压测连接：send()只负责发送，接收线程负责配对响应和检查超时"""
+
+    def __init__(self, host, port, result, timeout=5.0):
+        self.host = host
+        self.port = port
+        self.result = result
+        # 等待响应回显的超时时间（秒）
+        self.timeout = timeout
+        self.socket = None
+        self.cond = threading.Condition()
+        # 尚未收到响应的命令: (命令名, 命令, 发送时间)
+        self.outstanding = deque()
+        self.reader = None
+
+    @property
+    def connected(self):
+        return self.socket is not None
+
+    def connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        # 接收线程用短超时定期检查未响应命令是否超时
+        sock.settimeout(0.1)
+        with self.cond:
+            self.socket = sock
+            self.outstanding.clear()
+        self.reader = threading.Thread(target=self._read_loop, args=(sock,), daemon=True)
+        self.reader.start()
+
+    def close(self, pending_is_timeout=False):
+        with self.cond:
+            sock, self.socket = self.socket, None
+            # 连接断开时尚未响应的命令记为连接错误，压测结束时仍未响应的命令记为超时
+            while self.outstanding:
+                self.outstanding.popleft()
+                self.result.record_failure(is_timeout=pending_is_timeout)
+            self.cond.notify_all()
+        if sock:
+            try:
+                sock.close()
+            except OSError:
+                pass
+        if self.reader and self.reader is not threading.current_thread():
+            self.reader.join()
+
+    def send(self, command):
+        """发送命令并登记为未响应，返回发送时间；连接已被接收线程关闭时抛出ConnectionError"""
+        with self.cond:
+            sock = self.socket
+            if sock is None:
+                raise ConnectionError("连接已断开")
+            send_time = time.perf_counter()
+            self.outstanding.append((command.split(' ')[0], command, send_time))
+        sock.sendall((command + '\r\n').encode())
+        return send_time
+
+    def wait_idle(self, deadline):
+        """等待所有已发送的命令收到响应（或超时），closed模式下用于等待上一条命令的响应"""
+        with self.cond:
+            while self.outstanding and self.socket is not None:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    return False
+                self.cond.wait(remaining)
+            return True
+
+    def _read_loop(self, sock):
+        buffer = ""
+        while True:
+            try:
+                data = sock.recv(16384)
+                if not data:
+                    raise ConnectionError("Connection closed by server")
+            except socket.timeout:
+                self._expire()
+                continue
+            except (OSError, ConnectionError):
+                if self.socket is sock:
+                    self.close()
+                return
+            now = time.perf_counter()
+            buffer += data.decode('utf-8', errors='ignore')
+            lines = buffer.split('\n')
+            buffer = lines.pop()
+            for line in lines:
+                self._handle_line(line.strip(), now)
+            self._expire()
+
+    def _handle_line(self, line, now):
+        if not line:
+            return
+        self.result.record_line(line)
+        name = line.split(' ')[0]
+        with self.cond:
+            # 与第一条同名的未响应命令配对，排在它之前的命令已经收不到响应，记为超时
+            for i, (pending_name, command, send_time) in enumerate(self.outstanding):
+                if pending_name == name:
+                    for _ in range(i):
+                        self.outstanding.popleft()
+                        self.result.record_failure(is_timeout=True)
+                    self.outstanding.popleft()
+                    self.result.record(command, now - send_time)
+                    self.cond.notify_all()
+                    return
+
+    def _expire(self):
+        now = time.perf_counter()
+        with self.cond:
+            expired = False
+            while self.outstanding and now - self.outstanding[0][2] > self.timeout:
+                self.outstanding.popleft()
+                self.result.record_failure(is_timeout=True)
+                expired = True
+            if expired:
+                self.cond.notify_all()
+
+
+class StepResult:
+    """记录一个负载级别内所有连接的统计数据"""
+
+    def __init__(self, level, target_rate=None):
+        self.level = level
+        self.target_rate = target_rate
+        self.lock = threading.Lock()
+        self.latencies = {}
+        # 在本级持续时间内完成的命令数，用于计算实际吞吐量
+        self.completed_in_window = 0
+        self.sent = 0
+        self.max_send_lag = 0.0
+        self.timeouts = 0
+        self.connection_errors = 0
+        self.error_lines = 0
+        self.loss_view_events = 0
+        self.first_error_offset = None
+        self.first_loss_view_offset = None
+        self.start_time = None
+        self.duration = None
+
+    def _offset(self):
+        return time.perf_counter() - self.start_time
+
+    def record_send(self, lag):
+        with self.lock:
+            self.sent += 1
+            self.max_send_lag = max(self.max_send_lag, lag)
+
+    def record(self, command, latency):
+        in_window = self._offset() <= self.duration
+        with self.lock:
+            self.latencies.setdefault(command, []).append(latency)
+            if in_window:
+                self.completed_in_window += 1
+
+    def record_line(self, line):
+        has_error = any(m.group(2) != '0' for m in ERROR_PATTERN.finditer(line))
+        has_loss = any(m.group(1) != '0' or m.group(2) != '0' for m in LOSS_VIEW_PATTERN.finditer(line))
+        if not has_error and not has_loss:
+            return
+        offset = self._offset()
+        with self.lock:
+            if has_error:
+                self.error_lines += 1
+                if self.first_error_offset is None:
+                    self.first_error_offset = offset
+            if has_loss:
+                self.loss_view_events += 1
+                if self.first_loss_view_offset is None:
+                    self.first_loss_view_offset = offset
+
+    def record_failure(self, is_timeout):
+        offset = self._offset()
+        with self.lock:
+            if is_timeout:
+                self.timeouts += 1
+            else:
+                self.connection_errors += 1
+            if self.first_error_offset is None:
+                self.first_error_offset = offset
+
+    def summary(self):
+        all_latencies = sorted(l for values in self.latencies.values() for l in values)
+        completed = len(all_latencies)
+        failed = self.timeouts + self.connection_errors
+        send_rate = self.sent / self.duration if self.duration > 0 else 0.0
+        return {
+            "level": self.level,
+            "elapsed": self.duration,
+            "sent": self.sent,
+            "send_rate": send_rate,
+            "rate_shortfall": (self.target_rate is not None and
+                               send_rate < self.target_rate * RATE_SHORTFALL_RATIO),
+            "max_send_lag": self.max_send_lag,
+            "completed": completed,
+            "throughput": self.completed_in_window / self.duration if self.duration > 0 else 0.0,
+            "p50": percentile(all_latencies, 50),
+            "p95": percentile(all_latencies, 95),
+            "p99": percentile(all_latencies, 99),
+            "max": all_latencies[-1] if all_latencies else None,
+            "timeouts": self.timeouts,
+            "connection_errors": self.connection_errors,
+            "error_lines": self.error_lines,
+            "loss_view_events": self.loss_view_events,
+            "failure_rate": failed / self.sent if self.sent else 0.0,
+            "first_error_offset": self.first_error_offset,
+            "first_loss_view_offset": self.first_loss_view_offset,
+            "per_command": {cmd: sorted(values) for cmd, values in self.latencies.items()},
+        }
+
+
+def _run_worker(conn, commands, offset, result, stop_at, interval):
+    """压测发送线程：interval为None时收到响应后立即发送下一条（closed），否则按固定间隔发送（rate）"""
+    index = offset
+    next_send = time.perf_counter()
+    while time.perf_counter() < stop_at:
+        if not conn.connected:
+            try:
+                conn.connect()
+            except OSError:
+                result.record_send(0.0)
+                result.record_failure(is_timeout=False)
+                time.sleep(min(1.0, max(0.0, stop_at - time.perf_counter())))
+                continue
+            # 重连后从当前时间开始按计划发送，不补发断开期间错过的命令
+            next_send = max(next_send, time.perf_counter())
+
+        command = commands[index % len(commands)]
+        index += 1
+
+        if interval is not None:
+            now = time.perf_counter()
+            if next_send >= stop_at:
+                break
+            if next_send > now:
+                time.sleep(next_send - now)
+                # 等待期间连接可能已被接收线程关闭，重新连接后再发送
+                if not conn.connected:
+                    continue
+            scheduled = next_send
+            next_send += interval
+        else:
+            scheduled = None
+
+        try:
+            send_time = conn.send(command)
+        except OSError:
+            conn.close()
+            continue
+        result.record_send(send_time - scheduled if scheduled is not None else 0.0)
+
+        if interval is None:
+            conn.wait_idle(send_time + conn.timeout + 1.0)
+
+    # 停止发送后等待已发送命令的响应
+    conn.wait_idle(time.perf_counter() + conn.timeout)
+    conn.close(pending_is_timeout=True)
+
+
+def run_step(host, port, commands, level, mode, connections, duration, timeout):
+    """运行一个负载级别：rate模式下level为总命令速率（条/秒），closed模式下level为并行连接数"""
+    if mode == "closed":
+        worker_count = int(level)
+        interval = None
+        result = StepResult(level)
+    else:
+        worker_count = connections
+        interval = worker_count / float(level)
+        result = StepResult(level, target_rate=float(level))
+
+    conns = [StressConnection(host, port, result, timeout) for _ in range(worker_count)]
+    result.start_time = time.perf_counter()
+    result.duration = duration
+    stop_at = result.start_time + duration
+    threads = []
+    for i, conn in enumerate(conns):
+        t = threading.Thread(target=_run_worker, args=(conn, commands, i, result, stop_at, interval), daemon=True)
+        threads.append(t)
+        t.start()
+    for t in threads:
+        t.join()
+    return result.summary()
+
+
+def _format_ms(value):
+    return f"{value * 1000:.1f}" if value is not None else "-"
+
+
+def print_step(summary, mode):
+    unit = "条/秒" if mode == "rate" else "连接"
+    print(f"\n[{get_timestamp()}] 负载级别: {summary['level']} {unit}")
+    print(f"   发送: {summary['sent']} ({summary['send_rate']:.2f} 条/秒), 完成: {summary['completed']}, "
+          f"实际吞吐量: {summary['throughput']:.2f} 条/秒")
+    if summary['rate_shortfall']:
+        print(f"   未达到目标速率: 实际发送 {summary['send_rate']:.2f} 条/秒, "
+              f"最大发送滞后 {_format_ms(summary['max_send_lag'])} ms")
+    print(f"   延迟(ms): p50={_format_ms(summary['p50'])}, p95={_format_ms(summary['p95'])}, "
+          f"p99={_format_ms(summary['p99'])}, max={_format_ms(summary['max'])}")
+    print(f"   超时: {summary['timeouts']}, 连接错误: {summary['connection_errors']}, "
+          f"错误行: {summary['error_lines']}, loss_view异常: {summary['loss_view_events']}")
+    if summary['first_error_offset'] is not None:
+        print(f"   首次出现错误: 本级开始后 {summary['first_error_offset']:.1f} 秒")
+    if summary['first_loss_view_offset'] is not None:
+        print(f"   首次出现loss_view异常: 本级开始后 {summary['first_loss_view_offset']:.1f} 秒")
+    for cmd, values in summary['per_command'].items():
+        print(f"   {cmd}: {len(values)} 次, p50={_format_ms(percentile(values, 50))}, "
+              f"p99={_format_ms(percentile(values, 99))}")
+
+
+def print_report(summaries, mode):
+    print("\n压力测试汇总:")
+    print(f"   {'级别':>8} {'发送速率':>10} {'吞吐量':>10} {'p50(ms)':>10} {'p95(ms)':>10} {'p99(ms)':>10} "
+          f"{'失败率':>8} {'loss_view':>10}")
+    for s in summaries:
+        shortfall = "*" if s['rate_shortfall'] else " "
+        print(f"   {s['level']:>8} {s['send_rate']:>9.2f}{shortfall} {s['throughput']:>10.2f} "
+              f"{_format_ms(s['p50']):>10} {_format_ms(s['p95']):>10} "
+              f"{_format_ms(s['p99']):>10} {s['failure_rate']:>8.1%} {s['loss_view_events']:>10}")
+    if any(s['rate_shortfall'] for s in summaries):
+        print("   * 实际发送速率未达到目标速率")
+
+    peak = max(summaries, key=lambda s: s['throughput'])
+    print(f"\n   最大实际吞吐量: {peak['throughput']:.2f} 条/秒 (负载级别 {peak['level']})")
+    for s in summaries:
+        if s['failure_rate'] > 0 or s['error_lines'] > 0:
+            print(f"   首次出现错误的负载级别: {s['level']}")
+            break
+    for s in summaries:
+        if s['loss_view_events'] > 0:
+            print(f"   首次出现loss_view异常的负载级别: {s['level']}")
+            break
+
+
+def write_csv(path, summaries):
+    keys = ("level", "elapsed", "sent", "send_rate", "rate_shortfall", "max_send_lag", "completed", "throughput",
+            "p50", "p95", "p99", "max", "timeouts", "connection_errors", "error_lines", "loss_view_events",
+            "failure_rate")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(",".join(keys) + "\n")
+        for s in summaries:
+            f.write(",".join("" if s[k] is None else str(s[k]) for k in keys) + "\n")
+
+
+def parse_levels(text, mode):
+    """解析负载级别，级别必须为正数，closed模式下必须为正整数"""
+    levels = []
+    for part in text.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        level = int(part) if mode == "closed" else float(part)
+        if level <= 0:
+            raise ValueError(f"负载级别必须大于0: {part}")
+        levels.append(level)
+    if not levels:
+        raise ValueError("负载级别为空")
+    return levels
+
+
+def main():
+    config = configparser.ConfigParser()
+    config.read('config.ini', encoding='utf-8')
+    default_host = config.get('Connection', 'host', fallback='192.168.2.24')
+    default_port = config.getint('Connection', 'port', fallback=22001)
+
+    parser = argparse.ArgumentParser(description="RCS探测器命令吞吐压力测试")
+    parser.add_argument("--host", default=default_host)
+    parser.add_argument("--port", type=int, default=default_port)
+    parser.add_argument("--mode", choices=["rate", "closed"], default="rate",
+                        help="rate: 按目标速率发送，不等待响应; closed: 每个连接收到响应后立即发送下一条")
+    parser.add_argument("--levels", default="1,2,5,10,20",
+                        help="逐级提升的负载，rate模式为总速率(条/秒)，closed模式为并行连接数")
+    parser.add_argument("--connections", type=int, default=1, help="rate模式下的并行连接数")
+    parser.add_argument("--duration", type=float, default=30.0, help="每个负载级别的持续时间（秒）")
+    parser.add_argument("--commands", default=",".join(DEFAULT_COMMANDS),
+                        help="以逗号分隔的命令组合，必须存在于sscom51.ini中")
+    parser.add_argument("--sscom", default="sscom51.ini", help="命令配置文件")
+    parser.add_argument("--timeout", type=float, default=5.0, help="等待响应的超时时间（秒）")
+    parser.add_argument("--max-failure-rate", type=float, default=0.5,
+                        help="某级失败率超过该值时停止继续加压")
+    parser.add_argument("--csv", help="将每级统计结果写入CSV文件")
+    args = parser.parse_args()
+
+    try:
+        levels = parse_levels(args.levels, args.mode)
+    except ValueError as e:
+        parser.error(f"--levels 无效: {e}")
+    if args.connections <= 0:
+        parser.error("--connections 必须大于0")
+    if args.duration <= 0:
+        parser.error("--duration 必须大于0")
+
+    available = load_sscom_commands(args.sscom)
+    commands = [cmd.strip() for cmd in args.commands.split(",") if cmd.strip()]
+    missing = [cmd for cmd in commands if cmd not in available]
+    if missing:
+        print(f"以下命令不在{args.sscom}中: {', '.join(missing)}")
+        sys.exit(1)
+    if not commands:
+        print("命令组合为空")
+        sys.exit(1)
+
+    print(f"[{get_timestamp()}] 开始压力测试 {args.host}:{args.port}, 模式: {args.mode}, 命令组合: {', '.join(commands)}")
+    summaries = []
+    try:
+        for level in levels:
+            summary = run_step(args.host, args.port, commands, level, args.mode, args.connections,
+                               args.duration, args.timeout)
+            summaries.append(summary)
+            print_step(summary, args.mode)
+            if summary['failure_rate'] > args.max_failure_rate:
+                print(f"\n[{get_timestamp()}] 失败率 {summary['failure_rate']:.1%} 超过阈值，停止加压")
+                break
+    except KeyboardInterrupt:
+        print("\n程序被用户中断")
+
+    if summaries:
+        print_report(summaries, args.mode)
+        if args.csv:
+            write_csv(args.csv, summaries)
+
+
+if __name__ == '__main__':
+    main()
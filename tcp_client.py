@@ -7,21 +7,92 @@ import configparser
 import threading
 import queue
 import os
+import itertools
 from datetime import datetime
 
+from check_rules import load_rules, RuleSet
+from flight_recorder import FlightRecorder
+from control_server import ControlServer
+from adaptive_scheduler import AdaptivePoller
+
+def load_sscom_commands(path='sscom51.ini'):
+    """读取sscom51.ini中的A类型（ASCII字符串）命令，按文件顺序返回命令列表"""
+    commands = []
+    with open(path, 'r', encoding='gbk') as f:
+        for line in f:
+            line = line.strip()
+            # 跳过注释和空行
+            if line.startswith(';') or not line:
+                continue
+            # 解析命令行
+            if line.startswith('N'):
+                parts = line.split('=', 1)
+                if len(parts) == 2:
+                    cmd_parts = parts[1].split(',', 2)
+                    if len(cmd_parts) >= 2:
+                        # 只添加A类型的命令（ASCII字符串）且命令不为空
+                        if cmd_parts[0] == 'A' and cmd_parts[1].strip():
+                            commands.append(cmd_parts[1].strip())
+    return commands
+
+# 注入命令和轮询命令收到数据后，超过该空闲时间没有新数据即认为响应结束（秒）
+RESPONSE_QUIET_TIME = 0.5
+# 一次状态轮询的最短耗时（秒）：接收线程处理状态查询命令的响应时额外等待0.3秒并重试接收5次（每次0.1秒）
+POLL_MIN_DURATION = 0.8
+
+class PendingCommand:
+    """等待响应的单条命令（控制接口注入的命令或自适应轮询命令），发送线程发送后收集其原始响应"""
+    def __init__(self, command, priority=0, timeout=30.0):
+        self.command = command
+        self.priority = priority
+        # 从注入开始计算的截止时间，包括排队等待和等待响应的时间
+        self.deadline = time.time() + timeout
+        self.done = threading.Event()
+        self.chunks = []
+        self.sent_time = None
+        self.last_data_time = None
+        self.error = None
+
+    def response(self):
+        return b"".join(self.chunks).decode('utf-8', errors='ignore')
+
 class TCPClient:
-    def __init__(self, host='192.168.2.24', port=22001, reconnect_interval=5):
+    def __init__(self, host='192.168.2.24', port=22001, reconnect_interval=5, log_verbosity='full',
+                 recorder_size=2000, adaptive_poller=None):
         self.host = host
         self.port = port
         self.reconnect_interval = reconnect_interval
         self.socket = None
         self.connected = False
         self.running = True
-        self.send_queue = queue.Queue()
+        # 注入命令的优先级队列，元素为 (优先级, 序号, PendingCommand)，优先级数值越小越先发送
+        self.send_queue = queue.PriorityQueue()
+        self.injection_seq = itertools.count()
+        # 正在等待响应的注入命令或轮询命令，接收线程会把从其回显开始的原始数据复制给它
+        self.pending_command = None
+        # 接收线程最近一次收到数据的时间，注入命令在接收空闲后才发送，避免收到上一条命令的响应尾部
+        self.last_recv_time = 0.0
+        # 暂停标志，暂停时不发送命令循环中的命令，但仍然发送注入的命令
+        self.paused = False
+        # 连接序号，每次连接成功后加1，用于让上一次连接的发送线程退出
+        self.connection_id = 0
+        # 自适应轮询，命令循环完成后按状态稳定程度调整状态查询命令的发送间隔；为None时不轮询
+        self.adaptive_poller = adaptive_poller
+        # 正在轮询的命令的观察结果: {"command": 命令名, "signature": [...], "anomaly": bool, "processed": Event}
+        self.poll_observation = None
+        # warning/error规则上一次的条件字段值: {(规则名, 非计数字段): 条件字段}，只有新出现或条件字段增加时才视为新的异常
+        self.anomaly_values = {}
         self.current_command_index = 0
         self.commands = []
         # 创建日志文件
         self.log_file = self.create_log_file()
+        # 日志详细程度：full记录所有响应行，summary只记录发送、响应首行、提示信息以及触发keep_in_summary规则的响应行
+        self.log_verbosity = log_verbosity
+        # 飞行记录器，在内存中保存最近的通信记录，检测到异常时转储到日志目录
+        self.flight_recorder = FlightRecorder(self.log_file, recorder_size)
+        # 上一次get_img_handle_status返回的recv值，用于判断recv计数是否停止增长
+        self.last_recv_value = None
+        self.recv_stalled = False
         # 标记是否是第一次连接
         self.is_first_connection = True
         # 添加重连标志
@@ -32,31 +103,26 @@ class TCPClient:
         self.recv_zero_detected = False
         self.error_detected = False
         self.load_commands()
+        self.load_check_rules()
 
     def load_commands(self):
         self.commands = []
         try:
-            with open('sscom51.ini', 'r', encoding='gbk') as f:
-                for line in f:
-                    line = line.strip()
-                    # 跳过注释和空行
-                    if line.startswith(';') or not line:
-                        continue
-                    # 解析命令行
-                    if line.startswith('N'):
-                        parts = line.split('=', 1)
-                        if len(parts) == 2:
-                            cmd_parts = parts[1].split(',', 2)
-                            if len(cmd_parts) >= 2:
-                                # 只添加A类型的命令（ASCII字符串）且命令不为空
-                                if cmd_parts[0] == 'A' and cmd_parts[1].strip():
-                                    self.commands.append(cmd_parts[1].strip())
+            self.commands = load_sscom_commands('sscom51.ini')
             # 确保关键命令存在于命令列表中
             self._ensure_critical_commands()
         except Exception as e:
             print(f"[{self.get_timestamp()}] 加载命令失败：{str(e)}")
             self.commands = []  # 如果加载失败，清空命令列表
             
+    def load_check_rules(self):
+        try:
+            # 所有检查规则编译为一个组合匹配器，不含规则关键字的接收数据只需一次预筛选
+            self.check_rules = load_rules('check_rules.ini')
+        except Exception as e:
+            print(f"[{self.get_timestamp()}] 加载检查规则失败：{str(e)}")
+            self.check_rules = RuleSet([])
+
     def _ensure_critical_commands(self):
         """确保关键命令存在于命令列表中，按照正确的顺序"""
         # 关键命令列表，按照执行顺序排列
@@ -106,6 +172,7 @@ class TCPClient:
                     self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
                     self.socket.connect((self.host, self.port))
                     self.connected = True
+                    self.connection_id += 1
                     connect_msg = f"成功连接到服务器 {self.host}:{self.port}"
                     print(f"[{self.get_timestamp()}] {connect_msg}")
                     self.write_log(connect_msg)
@@ -122,6 +189,14 @@ class TCPClient:
                     print(f"[{self.get_timestamp()}] {cmd_count_msg}")
                     self.write_log(cmd_count_msg)
                     
+                    # 重连后重新从detector_start之前的阶段开始检查
+                    self.check_rules.reset()
+                    self.last_recv_value = None
+                    self.recv_stalled = False
+                    self.anomaly_values = {}
+                    if self.adaptive_poller:
+                        self.adaptive_poller.reset()
+                    
                     # 重置连接状态标记
                     self.is_first_connection = False
                     
@@ -133,7 +208,7 @@ class TCPClient:
                     receive_thread.start()
                     
                     # 启动发送线程 - 每次连接成功后都会启动一个新的发送线程
-                    # 该线程会在完成一个完整的命令循环或网络断开时自动结束
+                    # 该线程完成一个完整的命令循环后只发送注入的命令，网络断开时自动结束
                     send_thread = threading.Thread(target=self.send_data, daemon=True)
                     send_thread.start()
                     
@@ -164,12 +239,28 @@ class TCPClient:
         last_printed_index = -1
         # 添加变量来跟踪命令循环是否完成
         cycle_completed = False
+        connection_id = self.connection_id
         
-        while self.running and self.connected and not cycle_completed:
+        while self.running and self.connected and connection_id == self.connection_id:
             try:
-                # 如果检测到异常情况，则不发送任何命令，但保持TCP连接
-                if self.recv_zero_detected or self.error_detected:
-                    time.sleep(1.0)  # 等待1秒后再检查标志
+                # 被暂停时不发送循环中的命令，但保持TCP连接，期间仍然发送通过控制接口注入的命令
+                if self.paused:
+                    self._serve_injected(1.0, connection_id)  # 等待1秒后再检查标志
+                    continue
+                
+                # 命令循环完成后，或检测到异常情况停止发送循环中的命令时，按自适应间隔发送状态查询命令，
+                # 以便在异常期间继续观察探测器状态；未启用自适应轮询时只发送注入的命令
+                if cycle_completed or self.recv_zero_detected or self.error_detected:
+                    command = None
+                    wait = 1.0
+                    if self.adaptive_poller:
+                        command, wait = self.adaptive_poller.next_command()
+                    if command:
+                        # 注入的命令优先于轮询命令
+                        self._serve_injected(0, connection_id)
+                        self._poll_status(command)
+                    else:
+                        self._serve_injected(min(wait, 1.0), connection_id)
                     continue
                     
                 if self.connected and self.commands:
@@ -211,6 +302,8 @@ class TCPClient:
                         send_msg = f"发送: {command}"
                         print(f"[{self.get_timestamp()}] {send_msg}")
                         self.write_log(send_msg)
+                        # 发送记录也经过检查规则，用于识别detector_start阶段
+                        self._check_line(send_msg)
                         last_command_sent = command
                         processed_command = True  # 标记当前命令已处理
                     
@@ -233,18 +326,20 @@ class TCPClient:
                                 self.write_log(cycle_msg)
                                 # 标记循环完成
                                 cycle_completed = True
-                                break
+                                continue
                     
                     # 重置重连标志
                     is_first_send_after_reconnect = False
                     
                     # 从配置文件中读取发送间隔时间
-                    time.sleep(2)  # 默认间隔2秒
+                    # 默认间隔2秒，间隔期间优先发送注入的命令
+                    self._serve_injected(2, connection_id)
             except Exception as e:
                 error_msg = f"发送错误：{str(e)}"
                 print(f"[{self.get_timestamp()}] {error_msg}")
                 self.write_log(error_msg)
                 self.connected = False
+                self._dump_flight_recorder("连接断开")
                 # 记录断开连接时的命令索引
                 disconnect_index_msg = f"断开连接时的命令索引: {self.current_command_index}"
                 print(f"[{self.get_timestamp()}] {disconnect_index_msg}")
@@ -276,6 +371,7 @@ class TCPClient:
                     try:
                         data = self.socket.recv(16384)  # 进一步增大接收缓冲区到16KB
                         last_data_time = time.time()
+                        self._capture_response(data)
                         
                         if data:
                             # 将接收到的数据添加到缓冲区
@@ -314,8 +410,7 @@ class TCPClient:
                             # 如果有足够的数据（包含high_board_temp），则处理并输出
                             if "high_board_temp" in detector_temp_data or len(detector_temp_data) > 200:
                                 # 打印和记录完整的温度数据
-                                print(f"{' ' * timestamp_prefix_len}{detector_temp_data}")
-                                self.write_log(detector_temp_data)
+                                self._log_response_line(detector_temp_data, timestamp_prefix_len)
                                 is_detector_temp = False
                                 detector_temp_data = ""
                                 continue
@@ -352,6 +447,7 @@ class TCPClient:
                                             chunk = self.socket.recv(16384)  # 使用更大的缓冲区
                                             if chunk:
                                                 more_data += chunk
+                                                self._capture_response(chunk)
                                                 last_data_time = time.time()
                                             else:
                                                 break
@@ -371,75 +467,11 @@ class TCPClient:
                                     # 分行处理响应，确保每行都有正确的缩进和日志记录
                                     for resp_line in lines[1:]:
                                         if resp_line.strip():
-                                            print(f"{' ' * timestamp_prefix_len}{resp_line.strip()}")
-                                            self.write_log(resp_line.strip())
-                                            
-                                            # 检查是否是get_img_handle_status命令的响应
-                                            if command_name == "get_img_handle_status":
-                                                # 检查recv值
-                                                if resp_line.strip().startswith("recv:"):
-                                                    try:
-                                                        # 提取recv值
-                                                        recv_value = int(resp_line.strip().split(":")[1].strip())
-                                                        # 如果recv值为0，设置标志
-                                                        if recv_value == 0:
-                                                            #self.recv_zero_detected = True
-                                                            self.recv_zero_detected = False
-                                                            # 记录无数据输入信息
-                                                            no_data_msg = "无数据输入"
-                                                            print(f"[{self.get_timestamp()}] {no_data_msg}")
-                                                            self.write_log(no_data_msg)
-                                                        else:
-                                                            # 如果recv值不为0，重置标志
-                                                            self.recv_zero_detected = False
-                                                    except ValueError:
-                                                        pass
-                                                
-                                                # 检查error值
-                                                elif resp_line.strip().startswith("recv error:"):
-                                                    try:
-                                                        error_value = int(resp_line.strip().split(":")[1].strip())
-                                                        if error_value != 0:
-                                                            self.error_detected = True
-                                                            # 记录存在错误信息
-                                                            error_msg = "存在错误"
-                                                            print(f"[{self.get_timestamp()}] {error_msg}")
-                                                            self.write_log(error_msg)
-                                                    except ValueError:
-                                                        pass
-                                                
-                                                # 检查sample error
-                                                elif resp_line.strip().startswith("sample error:"):
-                                                    try:
-                                                        error_value = int(resp_line.strip().split(":")[1].strip())
-                                                        if error_value != 0:
-                                                            self.error_detected = True
-                                                            # 记录存在错误信息
-                                                            error_msg = "存在错误"
-                                                            print(f"[{self.get_timestamp()}] {error_msg}")
-                                                            self.write_log(error_msg)
-                                                    except ValueError:
-                                                        pass
-                                                
-                                                # 检查angle error
-                                                elif resp_line.strip().startswith("angle error:"):
-                                                    try:
-                                                        error_value = int(resp_line.strip().split(":")[1].strip())
-                                                        if error_value != 0:
-                                                            self.error_detected = True
-                                                            # 记录存在错误信息
-                                                            error_msg = "存在错误"
-                                                            print(f"[{self.get_timestamp()}] {error_msg}")
-                                                            self.write_log(error_msg)
-                                                        else:
-                                                            # 如果所有error值都为0，重置错误标志
-                                                            if not self.error_detected:
-                                                                self.error_detected = False
-                                                    except ValueError:
-                                                        pass
-                                
+                                            # 记录响应并检查recv值和recv/sample/angle error等
+                                            self._log_response_line(resp_line.strip(), timestamp_prefix_len)
                                 # 添加一个空行，使输出更清晰
                                 print("")
+                                self._on_response_processed(command_name)
                                 
                                 # 如果是detector_temp命令，不需要继续处理
                                 if is_detector_temp:
@@ -470,8 +502,7 @@ class TCPClient:
                                         if line.strip():
                                             detector_temp_data += " " + line.strip()
                                     # 打印和记录完整的温度数据
-                                    print(f"{' ' * timestamp_prefix_len}{detector_temp_data}")
-                                    self.write_log(detector_temp_data)
+                                    self._log_response_line(detector_temp_data, timestamp_prefix_len)
                                     is_detector_temp = False
                                     detector_temp_data = ""
                             # 如果是新命令，立即处理之前的响应并开始新的响应
@@ -525,12 +556,14 @@ class TCPClient:
                 print(f"[{self.get_timestamp()}] {error_msg}")
                 self.write_log(error_msg)
                 self.connected = False
+                self._dump_flight_recorder("连接断开")
                 break
             except Exception as e:
                 error_msg = f"接收错误：{str(e)}"
                 print(f"[{self.get_timestamp()}] {error_msg}")
                 self.write_log(error_msg)
                 self.connected = False
+                self._dump_flight_recorder("连接断开")
                 break
                 
     def _process_buffer(self, buffer, current_command, command_response_lines, timestamp_prefix_len):
@@ -555,6 +588,194 @@ class TCPClient:
         # 处理剩余行
         if len(lines) > 1:
             self._process_command_response(lines[1:], timestamp_prefix_len)
+        self._on_response_processed(first_line.split(' ')[0])
+
+    def inject_command(self, command, priority=0, timeout=30.0):
+        """注入一条命令，阻塞直到收到响应或超时，返回PendingCommand"""
+        item = PendingCommand(command, priority, timeout)
+        self.send_queue.put((priority, next(self.injection_seq), item))
+        if not item.done.wait(timeout):
+            item.error = "等待响应超时"
+        return item
+
+    def _serve_injected(self, wait, connection_id):
+        """在wait秒内发送注入的命令；没有注入命令时相当于time.sleep(wait)。重连后旧连接的发送线程不再取注入的命令"""
+        deadline = time.time() + wait
+        while self.running and self.connected and connection_id == self.connection_id:
+            try:
+                entry = self.send_queue.get(timeout=max(deadline - time.time(), 0))
+            except queue.Empty:
+                return
+            if connection_id != self.connection_id or not self.connected:
+                # 等待期间已经重连，放回队列由新连接的发送线程发送
+                self.send_queue.put(entry)
+                return
+            self._send_injected(entry[2])
+
+    def _send_injected(self, item):
+        if time.time() >= item.deadline:
+            item.error = "排队超时"
+            item.done.set()
+            return
+        inject_msg = f"注入命令: {item.command} (优先级 {item.priority})"
+        print(f"[{self.get_timestamp()}] {inject_msg}")
+        self.write_log(inject_msg)
+        self._send_and_collect(item)
+
+    def _poll_status(self, command):
+        """发送一条自适应轮询命令，根据响应中的状态字段和异常情况调整该命令的轮询间隔"""
+        observation = {"command": command.split(' ')[0], "signature": [], "anomaly": False,
+                       "processed": threading.Event()}
+        self.poll_observation = observation
+        try:
+            self._send_and_collect(PendingCommand(command, timeout=10.0))
+            # 等待接收线程处理完整个响应，最多再等待1秒
+            observation["processed"].wait(1.0)
+        finally:
+            observation = self.poll_observation
+            self.poll_observation = None
+        self.adaptive_poller.report(command, observation["signature"], observation["anomaly"])
+
+    def _send_and_collect(self, item):
+        """等待接收空闲后发送命令并收集原始响应，直到响应结束或超时"""
+        try:
+            # 上一条命令的响应可能还在接收中，等待接收线程空闲
+            while time.time() - self.last_recv_time <= RESPONSE_QUIET_TIME and time.time() < item.deadline:
+                time.sleep(0.05)
+            self.pending_command = item
+            # 在发送前记录时间，接收线程可能在send()返回前就收到响应
+            item.sent_time = time.time()
+            self.socket.send((item.command + '\r\n').encode())
+            send_msg = f"发送: {item.command}"
+            print(f"[{self.get_timestamp()}] {send_msg}")
+            self.write_log(send_msg)
+            self._check_line(send_msg)
+            # 等待响应结束，注入命令的响应完整收到后才继续发送下一条命令
+            while time.time() < item.deadline:
+                if item.last_data_time is not None and time.time() - item.last_data_time > RESPONSE_QUIET_TIME:
+                    break
+                time.sleep(0.05)
+            if not item.chunks:
+                item.error = "未收到响应"
+        except Exception as e:
+            item.error = f"发送错误：{str(e)}"
+            raise
+        finally:
+            self.pending_command = None
+            item.done.set()
+
+    def _on_response_processed(self, command_name):
+        """接收线程处理完一条响应后调用，通知正在等待的轮询命令"""
+        observation = self.poll_observation
+        if observation is not None and observation["command"] == command_name:
+            observation["processed"].set()
+
+    def _capture_response(self, data):
+        """记录接收时间，并把数据复制给等待响应的命令；响应从首行回显命令名的那一行开始"""
+        self.last_recv_time = time.time()
+        item = self.pending_command
+        if item is None or not data:
+            return
+        if not item.chunks:
+            name = item.command.split(' ')[0].encode()
+            offset = 0
+            for line in data.split(b'\n'):
+                if line.strip().split(b' ')[0] == name:
+                    break
+                offset += len(line) + 1
+            else:
+                # 不是该命令的响应（如其他命令迟到的数据），忽略
+                return
+            data = data[offset:]
+        item.chunks.append(data)
+        item.last_data_time = self.last_recv_time
+
+    def _log_response_line(self, line, timestamp_prefix_len):
+        """记录一行响应数据并进行规则检查；summary模式下只写入触发keep_in_summary规则（包括所有warning/error规则）的行，
+        其余行只保存到飞行记录器，保证log_analyzer.py需要的sfp_connet和错误信息仍在日志中"""
+        misses = []
+        hits = self.check_rules.scan(line, misses)
+        if self.log_verbosity == 'full' or any(hit.rule.keep_in_summary for hit in hits):
+            print(f"{' ' * timestamp_prefix_len}{line}")
+            self.write_log(line)
+        else:
+            self.flight_recorder.record(line)
+        self._handle_hits(hits, misses)
+
+    def _check_line(self, line):
+        """使用检查规则扫描一行数据"""
+        misses = []
+        hits = self.check_rules.scan(line, misses)
+        self._handle_hits(hits, misses)
+
+    def _handle_hits(self, hits, misses=()):
+        """输出触发规则的提示信息，需要时暂停发送命令；misses为pattern匹配但条件不满足的规则，表示该异常已消失"""
+        for miss in misses:
+            self.anomaly_values.pop(self._anomaly_key(miss), None)
+        for hit in hits:
+            if hit.rule.name == "recv_count":
+                self._check_recv_stall(hit.fields["recv"])
+            if hit.rule.severity != "info" and self._is_new_anomaly(hit):
+                self._on_anomaly(hit.rule.message or hit.rule.name)
+            elif self.poll_observation is not None and not hit.rule.volatile and not hit.rule.sets_phase:
+                self.poll_observation["signature"].append((hit.rule.name, sorted(hit.fields.items())))
+            if hit.rule.pause_sending:
+                first_error = not self.error_detected
+                self.error_detected = True
+            else:
+                first_error = False
+            if hit.rule.message:
+                print(f"[{self.get_timestamp()}] {hit.rule.message}")
+                self.write_log(hit.rule.message)
+            if first_error:
+                self._dump_flight_recorder(hit.rule.message or hit.rule.name)
+
+    @staticmethod
+    def _anomaly_key(hit):
+        """非计数字段（如recv error/sample error的kind）区分同一规则的不同异常"""
+        return hit.rule.name, tuple(sorted((k, v) for k, v in hit.fields.items() if not isinstance(v, int)))
+
+    def _is_new_anomaly(self, hit):
+        """异常第一次出现或条件中的计数比上一次增加时返回True，持续存在但没有变化的异常不重复触发突发模式
+
+        只比较规则condition中用到的字段，total_view这类持续增长但不表示异常的字段不参与比较
+        """
+        key = self._anomaly_key(hit)
+        values = tuple(hit.fields[f] for f in hit.rule.condition_fields)
+        previous = self.anomaly_values.get(key)
+        self.anomaly_values[key] = values
+        return previous is None or any(v > p for v, p in zip(values, previous))
+
+    def _check_recv_stall(self, recv_value):
+        """recv计数与上一次相同时认为接收停止，每次停止只转储一次并只触发一次突发模式"""
+        if recv_value == self.last_recv_value:
+            if not self.recv_stalled:
+                self.recv_stalled = True
+                stall_msg = f"recv计数停止增长: {recv_value}"
+                print(f"[{self.get_timestamp()}] {stall_msg}")
+                self.write_log(stall_msg)
+                self._dump_flight_recorder("recv计数停止增长")
+                self._on_anomaly("recv计数停止增长")
+        else:
+            self.recv_stalled = False
+        self.last_recv_value = recv_value
+
+    def _on_anomaly(self, reason):
+        """出现异常时，自适应轮询立即切换到突发模式"""
+        if self.poll_observation is not None:
+            self.poll_observation["anomaly"] = True
+        if self.adaptive_poller and self.adaptive_poller.trigger_burst():
+            burst_msg = f"检测到异常({reason})，状态轮询切换到突发模式"
+            print(f"[{self.get_timestamp()}] {burst_msg}")
+            self.write_log(burst_msg)
+
+    def _dump_flight_recorder(self, reason):
+        filename = self.flight_recorder.dump(reason)
+        if filename:
+            dump_msg = f"飞行记录器转储({reason}): {filename}"
+            print(f"[{self.get_timestamp()}] {dump_msg}")
+            # 不记录到飞行记录器，避免转储信息本身触发下一次转储
+            self.write_log(dump_msg, record=False)
 
     def get_timestamp(self):
         return datetime.now().strftime('%Y-%m-%d %H:%M:%S.%f')[:-3]
@@ -566,15 +787,9 @@ class TCPClient:
         if not response_lines:
             return
             
-        # 创建与时间戳前缀长度相同的空白字符串，用于对齐后续行
-        alignment_prefix = ' ' * timestamp_prefix_len
-        
-        # 处理每一行响应
+        # 处理每一行响应，打印时与时间戳前缀对齐，不带时间戳前缀和接收标志
         for line in response_lines:
-            # 打印对齐的行，不带时间戳前缀和接收标志
-            print(f"{alignment_prefix}{line}")
-            # 记录到日志文件，不带接收标志
-            self.write_log(line)
+            self._log_response_line(line, timestamp_prefix_len)
         
         # 添加一个空行，使输出更清晰
         print("")
@@ -587,7 +802,9 @@ class TCPClient:
         filename = f"logs/{datetime.now().strftime('%Y-%m-%d_%H-%M-%S')}.txt"
         return filename
         
-    def write_log(self, message):
+    def write_log(self, message, record=True):
+        if record:
+            self.flight_recorder.record(message)
         with open(self.log_file, 'a', encoding='utf-8') as f:
             f.write(f"[{self.get_timestamp()}] {message}\n")
 
@@ -600,8 +817,39 @@ class TCPClient:
                 pass
 
 def main():
+    # 读取日志、控制接口和自适应轮询相关配置
+    config = configparser.ConfigParser()
+    config.read('config.ini', encoding='utf-8')
+    adaptive_poller = None
+    if config.getboolean('AdaptivePolling', 'enabled', fallback=False):
+        adaptive_poller = AdaptivePoller.from_config(config['AdaptivePolling'])
+        # 轮询命令依次发送，突发模式下每条命令的实际轮询间隔不会小于所有命令各轮询一次的时间
+        min_burst_interval = len(adaptive_poller.states) * POLL_MIN_DURATION
+        if adaptive_poller.burst_interval < min_burst_interval:
+            print(f"警告: burst_interval={adaptive_poller.burst_interval}秒小于{len(adaptive_poller.states)}条轮询命令"
+                  f"依次轮询所需的约{min_burst_interval:.1f}秒，突发模式下每条命令的实际轮询间隔约为{min_burst_interval:.1f}秒")
+    
     # 创建TCP客户端实例
-    client = TCPClient(host='192.168.2.24', port=22001)
+    client = TCPClient(host='192.168.2.24', port=22001,
+                       log_verbosity=config.get('Logging', 'verbosity', fallback='full'),
+                       recorder_size=config.getint('Logging', 'flight_recorder_size', fallback=2000),
+                       adaptive_poller=adaptive_poller)
+    
+    # 启动本地控制接口
+    control_server = None
+    if config.getboolean('Control', 'enabled', fallback=False):
+        control_host = config.get('Control', 'host', fallback='127.0.0.1')
+        control_port = config.getint('Control', 'port', fallback=8765)
+        try:
+            control_server = ControlServer(client, control_host, control_port)
+        except OSError as e:
+            # 端口被占用等情况下不使用控制接口，继续运行测试
+            control_msg = f"控制接口启动失败，继续运行但不提供控制接口: {str(e)}"
+            print(f"[{client.get_timestamp()}] {control_msg}")
+            client.write_log(control_msg)
+        else:
+            control_server.start()
+            print(f"[{client.get_timestamp()}] 控制接口已启动: http://{control_host}:{control_port}")
     
     try:
         # 开始连接
@@ -609,6 +857,8 @@ def main():
     except KeyboardInterrupt:
         print("\n程序被用户中断")
         client.stop()
+        if control_server:
+            control_server.stop()
 
 if __name__ == '__main__':
     main()
\ No newline at end of file